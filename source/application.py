@@ -45,7 +45,7 @@ class Application:
         self.parse_args()
 
         # load instructions
-        instruction_tuples = load(self.args.input)
+        instructions = load(self.args.input)
 
         # define emulator
         if self.args.namespace == "QT":
@@ -60,12 +60,14 @@ class Application:
 
         # main loop
         emulator.initialize_memory()
-        emulator.import_code(instruction_tuples)
+        emulator.import_code(*instructions)
         emulator.running = True
         while emulator.running:
-            emulator.run()
+            emulator.run_chunk()
 
-            if emulator.exit_code == 0x80:
+            if emulator.running:
+                self.modlink.update()
+            elif emulator.exit_code == 0x80:
                 self.modlink.process_syscall()
 
         # exit
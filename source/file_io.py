@@ -3,41 +3,47 @@ File reading and writing implementations.
 """
 
 
+from array import array
+from mmap import mmap, ACCESS_READ
 from typing import TextIO
-from numpy import ndarray
+from numpy import ndarray, frombuffer, uint8, uint16
 from source.qt_emulator import QTEmulator
 
 
-def load(filepath: str) -> list[tuple[int, int, int]]:
+def load(filepath: str) -> tuple[ndarray, ndarray, ndarray]:
     """
     Reads binary executable file, compiled by Q-Compiler
     :param filepath: executable filepath
-    :return: list of instruction tuples
+    :return: arrays of instruction memory flags, opcodes and values (see QTEmulator.import_code)
     """
 
-    instructions = list()
-    with open(filepath, "rb") as file:
-        namespace = b''  # namespace header
-        while (char := file.read(1)) != b'\x00':
-            namespace += char
+    with open(filepath, "rb") as file, mmap(file.fileno(), 0, access=ACCESS_READ) as data:
+        # namespace header, terminated by null byte
+        separator = data.find(b'\x00')
+        if separator == -1:
+            raise Exception
+        namespace = data[:separator]
 
         # read and decode instructions
-        while True:
-            if namespace == b'QT':
-                raw_instruction = file.read(4)
-            elif namespace == b'QM':
-                raw_instruction = file.read(3)
-            else:
-                raise Exception
-            if not raw_instruction:
-                break
+        if namespace == b'QT':
+            instruction_size = 4
+        elif namespace == b'QM':
+            instruction_size = 3
+        else:
+            raise Exception
 
-            memory_flag = raw_instruction[0] & 1
-            value = int.from_bytes(raw_instruction[1:3])
-            opcode = raw_instruction[3]
+        # M`VVVVVVVV`VVVVVVVV`OOOOOOOO per instruction; incomplete trailing instruction is dropped
+        raw = frombuffer(data, dtype=uint8, offset=separator + 1)
+        raw = raw[:len(raw) - len(raw) % instruction_size].reshape(-1, instruction_size)
 
-            instructions.append((memory_flag, value, opcode))
-    return instructions
+        memory_flags = raw[:, 0] & 1
+        opcodes = raw[:, 3].copy()
+        values = (raw[:, 1].astype(uint16) << 8) | raw[:, 2]
+
+        # mapped file can't be closed while views on it still exist
+        del raw
+
+    return memory_flags, opcodes, values
 
 
 class QTEmulatorIO:
@@ -52,21 +58,26 @@ class QTEmulatorIO:
     section_size = offset * (number_offset + 1) + index_offset + added_offset
 
     @classmethod
-    def _create_memory_dump(cls, file: TextIO, memory: ndarray, section_name: str):
+    def _create_memory_dump(cls, file: TextIO, memory: array, section_name: str):
         """
         Writes dump for a given memory section
         """
 
-        file.write(f"{'[' + section_name.upper() + ' SECTION START]':=^{cls.section_size}}\n")
-        file.write(" " * (cls.index_offset + cls.added_offset))
-        for i in range(cls.offset):
-            file.write(f"{i: {cls.number_offset}d} ")
-        for index in range(0, len(memory), cls.offset):
-            file.write(
-                "\n" +
-                f"{index:0{cls.index_offset}d} | " +
-                " ".join(f"{val:0{cls.number_offset}d}" for val in memory[index:index + cls.offset]))
-        file.write(f"\n{'[' + section_name.upper() + ' SECTION END]':=^{cls.section_size}}\n\n")
+        number_format = f"%0{cls.number_offset}d"
+        values = memory.tolist()
+
+        lines = [
+            f"{'[' + section_name.upper() + ' SECTION START]':=^{cls.section_size}}\n",
+            " " * (cls.index_offset + cls.added_offset),
+            "".join(f"{i: {cls.number_offset}d} " for i in range(cls.offset))]
+        lines.extend(
+            "\n" +
+            f"{index:0{cls.index_offset}d} | " +
+            " ".join([number_format % val for val in values[index:index + cls.offset]])
+            for index in range(0, len(values), cls.offset))
+        lines.append(f"\n{'[' + section_name.upper() + ' SECTION END]':=^{cls.section_size}}\n\n")
+
+        file.write("".join(lines))
 
     @classmethod
     def create_memory_dump(cls, filepath: str, emulator: QTEmulator):
@@ -81,13 +92,17 @@ class QTEmulatorIO:
         with open(f"{filepath}.ADDR_STACK.dmp", "w", encoding="ASCII") as file:
             cls._create_memory_dump(file, emulator.address_stack, "ADDR_STACK")
         with open(f"{filepath}.PORTS.dmp", "w", encoding="ASCII") as file:
-            cls._create_memory_dump(file, emulator.ports, "PORTS")
+            # ports are sparse, dump all of them
+            ports = array('H', [0]) * 2**emulator.ADDRESS_BIT_WIDTH
+            for address, value in emulator.ports.items():
+                ports[address] = value
+            cls._create_memory_dump(file, ports, "PORTS")
         with open(f"{filepath}.REGISTERS.dmp", "w", encoding="ASCII") as file:
             file.write(f"{'[REGISTER SECTION START]':=^{cls.section_size}}\n")
-            file.write(f"{'ACC': <4} = {emulator.accumulator.item()}\n")
-            file.write(f"{'PR': <4} = {emulator.pointer_register.item()}\n")
-            file.write(f"{'PC': <4} = {emulator.program_counter.item()}\n")
-            file.write(f"{'FR': <4} = {emulator.flag_register.item()}\n")
-            file.write(f"{'SP': <4} = {emulator.stack_pointer.item()}\n")
-            file.write(f"{'ASP': <4} = {emulator.address_stack_pointer.item()}\n")
+            file.write(f"{'ACC': <4} = {emulator.accumulator}\n")
+            file.write(f"{'PR': <4} = {emulator.pointer_register}\n")
+            file.write(f"{'PC': <4} = {emulator.program_counter}\n")
+            file.write(f"{'FR': <4} = {emulator.flag_register}\n")
+            file.write(f"{'SP': <4} = {emulator.stack_pointer}\n")
+            file.write(f"{'ASP': <4} = {emulator.address_stack_pointer}\n")
             file.write(f"{'[REGISTER SECTION END]':=^{cls.section_size}}\n")
@@ -8,6 +8,7 @@ import time
 import numpy as np
 import pygame as pg
 from enum import IntEnum
+from typing import Callable
 from source.qt_emulator import QTEmulator
 
 
@@ -22,14 +23,10 @@ class ColorMode(IntEnum):
     RGB888 = 24     # 24 bit RGB
 
 
-class RGB565Correction:
-    """
-    Small correction values for RGB565
-    """
-
-    RGB565_R = 255 / (2 ** 5 - 1)
-    RGB565_G = 255 / (2 ** 6 - 1)
-    RGB565_B = 255 / (2 ** 5 - 1)
+# RGB565 lookup tables from raw 5 / 6 / 5 bit channel values to 0 - 255 values
+RGB565_R_LUT = (np.arange(2 ** 5) * (255 / (2 ** 5 - 1))).astype(np.uint8)
+RGB565_G_LUT = (np.arange(2 ** 6) * (255 / (2 ** 6 - 1))).astype(np.uint8)
+RGB565_B_LUT = (np.arange(2 ** 5) * (255 / (2 ** 5 - 1))).astype(np.uint8)
 
 
 class ModuleLinker:
@@ -42,6 +39,11 @@ class ModuleLinker:
 
         self.screen_module: ScreenModule | None = None
 
+        # [MODULE INDEX] -> module syscall handler
+        self._syscall_table: dict[int, Callable] = {
+            1: self._process_screen,    # screen
+        }
+
     def process_syscall(self):
         """
         Processes CPU syscall interrupts
@@ -49,12 +51,22 @@ class ModuleLinker:
 
         # [MODULE INDEX] - port 0
         # 1. screen
-        match self.emulator.ports[0]:
-            case 1:  # screen
-                self.emulator.running = True
-                self._process_screen()
-            case _:
-                pass
+        handler = self._syscall_table.get(self.emulator.ports.get(0, 0))
+        if handler is not None:
+            self.emulator.running = True
+            handler()
+
+    def update(self):
+        """
+        Updates modules in between instruction chunks
+        """
+
+        if self.screen_module is None or not self.screen_module.running:
+            return
+
+        # keeps window responsive, while CPU is busy not drawing anything
+        self.screen_module.update()
+        self._check_screen_closed()
 
     def exit(self):
         """
@@ -70,15 +82,15 @@ class ModuleLinker:
         """
 
         # [WIDTH | HEIGHT] - port 1
-        width = self.emulator.ports[1] >> 8
-        height = self.emulator.ports[1] & 0xFF
+        width = self.emulator.ports.get(1, 0) >> 8
+        height = self.emulator.ports.get(1, 0) & 0xFF
 
         # [MODE] - port 2
         # 1. BW
         # 8. BW8
         # 16. RGB565
         # 24. RGB888
-        mode = self.emulator.ports[2]
+        mode = self.emulator.ports.get(2, 0)
 
         if mode == 1:
             mode = "BW"
@@ -106,10 +118,18 @@ class ModuleLinker:
 
         # [START] - port 1
         # pointer to location in cache where screen data starts
-        start = self.emulator.ports[1]
+        start = self.emulator.ports.get(1, 0)
 
-        self.screen_module.blit_array(self.emulator.cache, start)
+        # renderers work on a numpy view of the cache, no data is copied
+        cache = np.frombuffer(self.emulator.cache, dtype=np.uint16)
+        self.screen_module.blit_array(cache, start)
         self.screen_module.update()
+        self._check_screen_closed()
+
+    def _check_screen_closed(self):
+        """
+        Stops the emulator, if screen window was closed
+        """
 
         if not self.screen_module.running:
             self.emulator.exit_code = 0
@@ -137,6 +157,25 @@ class ScreenModule:
         self._real_screen: pg.Surface | None = None
         self.fake_screen: pg.Surface | None = None
 
+        # frame size in pixels and in cache words
+        self._frame_pixels: int = width * height
+        self._frame_words: int = 0
+
+        # renderer for current color mode and the fake surface pixel view it draws into
+        self._blit_fn: Callable | None = None
+        self._pixels_fn: Callable | None = None
+
+        # RGB565 lookup table from whole 16 bit value to fake surface pixel value
+        self._rgb565_lut: np.ndarray | None = None
+
+        # scaled fake surface, redrawn only when fake surface changes
+        self._scaled_screen: pg.Surface | None = None
+        self._dirty: bool = False
+
+        # display and events are updated at most 60 times a second
+        self._update_interval: float = 1 / 60
+        self._last_update: float = 0.0
+
     def init(self):
         """
         init screen
@@ -157,9 +196,37 @@ class ScreenModule:
         # fake surface with 32x32 resolution
         self.fake_screen = self._real_screen.copy()
 
+        # renderers write straight into fake surface pixels
+        self._frame_words = {
+            ColorMode.BW: (self._frame_pixels + 15) // 16,
+            ColorMode.BW8: (self._frame_pixels + 1) // 2,
+            ColorMode.RGB565: self._frame_pixels,
+            ColorMode.RGB888: (self._frame_pixels * 3 + 1) // 2,
+        }[self.color_mode]
+        self._blit_fn, self._pixels_fn = {
+            ColorMode.BW: (self._blit_bw, self._pixels_rgb),                # black and white
+            ColorMode.BW8: (self._blit_bw8, self._pixels_rgb),              # grayscale
+            ColorMode.RGB565: (self._blit_rgb565, self._pixels_mapped),     # rgb565
+            ColorMode.RGB888: (self._blit_rgb888, self._pixels_rgb),        # rgb888
+        }[self.color_mode]
+
+        # whole RGB565 frame is then converted with a single lookup per pixel
+        if self.color_mode is ColorMode.RGB565:
+            values = np.arange(2 ** 16)
+            shifts = self.fake_screen.get_shifts()
+            losses = self.fake_screen.get_losses()
+            self._rgb565_lut = (
+                (RGB565_R_LUT[values >> 11].astype(np.uint32) >> losses[0] << shifts[0]) |
+                (RGB565_G_LUT[(values >> 5) & 0b111111].astype(np.uint32) >> losses[1] << shifts[1]) |
+                (RGB565_B_LUT[values & 0b11111].astype(np.uint32) >> losses[2] << shifts[2]) |
+                self.fake_screen.get_masks()[3])
+
         # resize real surface so you could even see it
         self._real_screen = pg.display.set_mode(size=(512, 512 * (self.width / self.height)), flags=flags)
 
+        # scale target of the same size as real surface and in the same pixel format as fake one
+        self._scaled_screen = pg.Surface(self._real_screen.get_size(), 0, self.fake_screen)
+
         # running to True
         self.running = True
 
@@ -176,16 +243,32 @@ class ScreenModule:
         Updates events
         """
 
-        # update image
-        self._real_screen.blit(
-            pg.transform.scale(self.fake_screen, self._real_screen.get_rect().size),
-            (0, 0))
-        pg.display.flip()
+        # rate limit; frames drawn in between are shown by the next update, or overwritten
+        now = time.monotonic()
+        if now - self._last_update < self._update_interval:
+            return
+        self._last_update = now
+
+        # update image, if anything was drawn since last update
+        if self._dirty:
+            size = self._real_screen.get_size()
+            if self._scaled_screen.get_size() != size:  # window was resized
+                self._scaled_screen = pg.Surface(size, 0, self.fake_screen)
 
-        # update events
-        for event in pg.event.get():
+            pg.transform.scale(self.fake_screen, size, self._scaled_screen)
+            self._real_screen.blit(self._scaled_screen, (0, 0))
+            pg.display.flip()
+            self._dirty = False
+
+        # update events; only handled event types are turned into event objects
+        for event in pg.event.get((pg.QUIT, pg.VIDEORESIZE)):
             if event.type == pg.QUIT:
                 self.quit()
+                return
+            self._dirty = True
+
+        # drop the rest of the queue
+        pg.event.clear(pump=False)
 
     def blit_array(self, array: np.ndarray, start: int):
         """
@@ -194,82 +277,73 @@ class ScreenModule:
         :param start: slice start
         """
 
-        self.fake_screen.fill(0)  # clear display
-        if self.color_mode is ColorMode.BW:         # black and white
-            self._blit_bw(array, start)
-        elif self.color_mode is ColorMode.BW8:      # grayscale
-            self._blit_bw8(array, start)
-        elif self.color_mode is ColorMode.RGB565:   # rgb565
-            self._blit_rgb565(array, start)
-        elif self.color_mode is ColorMode.RGB888:   # rgb888
-            self._blit_rgb888(array, start)
+        # every renderer writes all pixels of the frame, so display is not cleared beforehand
+        self._dirty = True
+
+        # fake surface stays locked while pixel view exists
+        frame = self._pixels_fn()
+        self._blit_fn(array, start, frame)
+        del frame
+
+    def _pixels_rgb(self) -> np.ndarray:
+        """
+        Returns (height, width, 3) view into fake surface RGB values
+        """
+
+        return pg.surfarray.pixels3d(self.fake_screen).swapaxes(0, 1)
 
-    def _blit_bw(self, array: np.ndarray, start: int):
+    def _pixels_mapped(self) -> np.ndarray:
+        """
+        Returns (height, width) view into fake surface mapped pixel values
+        """
+
+        return pg.surfarray.pixels2d(self.fake_screen).T
+
+    def _blit_bw(self, array: np.ndarray, start: int, frame: np.ndarray):
         """
         Blits a slice of array to screen in BW color mode
         """
 
-        for y in range(self.height):
-            for x in range(self.width):
-                true_index = x + y * self.width
-                index = true_index // 16
-                value = array[start + index]
-                if (value & (1 << (true_index % 17))) > 0:
-                    pg.draw.line(self.fake_screen, (255, 255, 255), (x, y), (x, y))
+        # little endian words, so that byte view is [bits 0 - 7] [bits 8 - 15] on any host
+        words = np.asarray(array[start:start + self._frame_words], dtype="<u2")
+
+        # pixel N is bit (N % 16) of word (N // 16)
+        bits = np.unpackbits(words.view(np.uint8), bitorder="little")[:self._frame_pixels]
 
-    def _blit_bw8(self, array: np.ndarray, start: int):
+        np.multiply(bits.reshape(self.height, self.width, 1), 255, out=frame)
+
+    def _blit_bw8(self, array: np.ndarray, start: int, frame: np.ndarray):
         """
         Blits a slice of array to screen in grayscale color mode
         """
 
-        for y in range(self.height):
-            for x in range(self.width):
-                index = (x + y * self.width) // 2
-                value = array[start + index]
-                color = (value & (0xFF << (x % 2))) >> (x % 2)
-                pg.draw.line(self.fake_screen, (color, color, color), (x, y), (x, y))
+        # [ODD PIXEL | EVEN PIXEL] -> low byte is even pixel, high byte is odd one
+        # little endian words, so byte view is already in pixel order on any host
+        words = np.asarray(array[start:start + self._frame_words], dtype="<u2")
+        gray = words.view(np.uint8)[:self._frame_pixels]
+
+        frame[...] = gray.reshape(self.height, self.width, 1)
 
-    def _blit_rgb565(self, array: np.ndarray, start: int):
+    def _blit_rgb565(self, array: np.ndarray, start: int, frame: np.ndarray):
         """
         Blits a slice of array to screen in RGB565 color mode
         """
 
-        color_data = array[start:start + self.width * self.height]
+        color_data = array[start:start + self._frame_words].reshape(self.height, self.width)
 
         # values need to be corrected to be in range of 0 - 255
-        red = ((color_data >> 11) * RGB565Correction.RGB565_R).astype(np.uint8)
-        green = (((color_data >> 5) & 0b111111) * RGB565Correction.RGB565_G).astype(np.uint8)
-        blue = ((color_data & 0b11111) * RGB565Correction.RGB565_B).astype(np.uint8)
-
-        image = pg.image.frombuffer(np.column_stack((red, green, blue)), (self.width, self.height), "RGB")
-        self.fake_screen.blit(image, (0, 0))
+        frame[...] = self._rgb565_lut[color_data]
 
-    def _blit_rgb888(self, array: np.ndarray, start: int):
+    def _blit_rgb888(self, array: np.ndarray, start: int, frame: np.ndarray):
         """
         Blits a slice of array to screen in RGB888 color mode
         """
 
-        for y in range(self.height):
-            for x in range(self.width):
-                true_index = x + y * self.width
-                index = true_index * 2
-
-                if true_index % 2 == 0:
-                    # [RED | GREEN] [BLUE | ...]
-                    rg = array[start + index]
-                    b = array[start + index + 1]
-
-                    red = rg >> 8
-                    green = rg & 0xFF
-                    blue = b >> 8
-                else:
-                    # [... | RED] [GREEN | BLUE]
-                    r = array[start + index - 1]
-                    gb = array[start + index]
+        words = np.asarray(array[start:start + self._frame_words], dtype=np.uint16)
 
-                    # values already go from 0 to 255, no correction needed
-                    red = r & 0xFF
-                    green = gb >> 8
-                    blue = gb & 0xFF
+        # [RED | GREEN] [BLUE | RED] [GREEN | BLUE] ...
+        # words are big endian byte pairs, so every 3 bytes of the stream are one pixel
+        stream = words.astype(">u2").view(np.uint8)[:self._frame_pixels * 3]
 
-                pg.draw.line(self.fake_screen, (red, green, blue), (x, y), (x, y))
+        # values already go from 0 to 255, no correction needed
+        frame[...] = stream.reshape(self.height, self.width, 3)
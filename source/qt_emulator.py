@@ -3,15 +3,166 @@ QT Architecture emulator
 """
 
 
-import warnings
+from array import array
+from functools import partial
 from typing import Callable
-from numpy import uint8, uint16, uint32, zeros, ndarray
+from numpy import ndarray
 
 
-warnings.filterwarnings('ignore')
-
 MAX_UINT16 = 2**16 - 1
 
+# flag register bits
+CARRY = 1 << 0
+PARITY = 1 << 1
+ZERO = 1 << 2
+SIGN = 1 << 3
+OVERFLOW = 1 << 4
+UNDERFLOW = 1 << 5
+
+
+# names, that instruction code can use besides 'self', 'acc', 'cache' and VAL
+_CODE_NAMESPACE: dict[str, int] = {
+    "MAX_UINT16": MAX_UINT16,
+    "CARRY": CARRY,
+    "OVERFLOW": OVERFLOW,
+    "UNDERFLOW": UNDERFLOW,
+}
+
+
+class CPUHalt(Exception):
+    """
+    Raised by instructions, that stop the CPU, to leave the execution loop
+    """
+
+
+def instruction(opcode: int, control: bool = False, changes_flags: bool = False,
+                code: str | None = None) -> Callable:
+    """
+    Marks QTEmulator method as instruction call.
+    Plain instructions are defined only by their code, that is used both in basic blocks and to generate
+    the method itself; method then only gives name and docstring
+    :param opcode: instruction opcode
+    :param control: instruction changes program counter or stops the CPU; it is also given its own address
+                    and returns address of next instruction
+    :param changes_flags: instruction changes ACC or flags, so flags need to be checked after it
+    :param code: python code of plain instruction; ACC is 'acc', cache is 'cache', VAL is '{value}'
+    """
+
+    # plain instructions end up in basic blocks, so they need code
+    if not control and code is None:
+        raise Exception(f"plain instruction {opcode} has no code")
+
+    def decorator(func: Callable) -> Callable:
+        if code is not None:
+            func = _make_instruction_method(func, code)
+        func.opcode = opcode
+        func.control = control
+        func.changes_flags = changes_flags
+        func.code = code
+        return func
+
+    return decorator
+
+
+def _make_instruction_method(func: Callable, code: str) -> Callable:
+    """
+    Generates instruction method from instruction code
+    :param func: instruction method, that gives name and docstring
+    :param code: instruction code
+    """
+
+    lines = [
+        f"def {func.__name__}(self, value):",
+        "    acc = self.accumulator",
+        "    cache = self.cache",
+        *("    " + line for line in code.replace("{value}", "value").split("\n")),
+        "    self.accumulator = acc"]
+
+    namespace = dict(_CODE_NAMESPACE)
+    exec("\n".join(lines), namespace)
+
+    method = namespace[func.__name__]
+    method.__qualname__ = func.__qualname__
+    method.__doc__ = func.__doc__
+    return method
+
+
+def _make_instruction_table(namespace: dict, opcode_bit_width: int) -> tuple[Callable, ...]:
+    """
+    Generate instruction table from class namespace
+    :param namespace: class namespace with instruction calls
+    :param opcode_bit_width: opcode bit width
+    """
+
+    table = [namespace["_unknown_instruction_halt"]] * 2**opcode_bit_width
+    for attr in namespace.values():
+        if hasattr(attr, "opcode"):
+            table[attr.opcode] = attr
+    return tuple(table)
+
+
+def _make_memory_mode(func: Callable) -> Callable:
+    """
+    Makes memory mode variant of instruction, that is given cache address instead of value
+    :param func: instruction
+    """
+
+    def memory_mode(self, address: int, *args):
+        return func(self, self.cache[address], *args)
+
+    memory_mode.__name__ = func.__name__
+    memory_mode.__qualname__ = func.__qualname__
+    memory_mode.__doc__ = func.__doc__
+    memory_mode.control = func.control
+    memory_mode.changes_flags = func.changes_flags
+    return memory_mode
+
+
+def _make_basic_block_source(start: int, body: list, end: tuple | None) -> str:
+    """
+    Generates source of basic block function, that runs straight-line instructions in one call.
+    Function is named 'block_{start}' and takes offset of instruction to start from;
+    control instruction is called as 'end_{start}'
+    :param start: address of first instruction
+    :param body: (instruction, memory flag, value) of plain instructions
+    :param end: (instruction, memory flag, value) of control instruction, that ends the block, or None
+    """
+
+    lines = [
+        f"def block_{start}(self, offset):",
+        "    acc = self.accumulator",
+        "    cache = self.cache"]
+
+    for index, (func, flag, value) in enumerate(body):
+        # instructions before the one, block was entered at, are skipped
+        lines.append(f"    if offset <= {index}:")
+
+        # if memory flag -> use cache value; read only now, as previous instructions may have written it
+        if flag:
+            lines.append(f"        value = cache[{value}]")
+            operand = "value"
+        else:
+            operand = str(value)
+        lines += ["        " + line for line in func.code.replace("{value}", operand).split("\n")]
+
+    # flags in between are not checked, as only control instructions read them
+    # block returns address of next instruction
+    lines.append("    self.accumulator = acc")
+    if end is None:
+        lines += [
+            f"    self.instructions_executed += {len(body) - 1} - offset",
+            f"    return {(start + len(body)) & MAX_UINT16}"]
+
+    # control instruction sees same flags, as if it was executed on its own
+    else:
+        _, end_flag, end_value = end
+        lines += [
+            "    self._check_flags()",
+            f"    self.instructions_executed += {len(body)} - offset",
+            f"    return end_{start}(self, {f'cache[{end_value}]' if end_flag else end_value}, {start + len(body)})"]
+
+    return "\n".join(lines)
+
 
 class QTEmulator:
     """
@@ -23,519 +174,543 @@ class QTEmulator:
     VALUE_BIT_WIDTH: int = ADDRESS_BIT_WIDTH
     OPCODE_BIT_WIDTH: int = 7
 
-    FLAG_MAPPING: dict[str, int] = {
-        "carry": 0,
-        "parity": 1,
-        "zero": 2,
-        "sign": 3,
-        "overflow": 4,
-        "underflow": 5
-    }
+    # maximum number of instructions in one basic block
+    MAX_BLOCK_LENGTH: int = 32
+
+    # fixed set of fields; instructions read and write registers through slots instead of instance dict
+    __slots__ = (
+        "rom_handler", "rom_check",
+        "cache", "stack", "address_stack", "ports",
+        "accumulator", "pointer_register", "program_counter", "flag_register",
+        "stack_pointer", "address_stack_pointer",
+        "instructions_executed", "running", "exit_code", "_flags_synced",
+    )
 
     def __init__(self):
         # program memory
-        self.rom: list[uint32] = list()
+        # instruction of every ROM address, resolved from opcode and bound to emulator and value
+        self.rom_handler: list[Callable] = list()
+
+        # whether flags need to be checked after instruction of every ROM address
+        self.rom_check: list[bool] = list()
 
         # array memory (cache)
-        self.cache: ndarray[uint16] | None = None
-        self.stack: ndarray[uint16] | None = None
-        self.address_stack: ndarray[uint16] | None = None
-        self.ports: ndarray[uint16] | None = None
+        # 'H' typed arrays, so that reads and writes go straight to and from python ints
+        self.cache: array | None = None
+        self.stack: array | None = None
+        self.address_stack: array | None = None
+
+        # ports are used only at a few addresses; unwritten ports read as 0
+        self.ports: dict[int, int] = dict()
 
         # register memory (registers)
-        self.accumulator: uint16 = uint16(0)
-        self.pointer_register: uint16 = uint16(0)
-        self.program_counter: uint16 = uint16(0)
-        self.flag_register: uint16 = uint16(0)
-        self.stack_pointer: uint16 = uint16(0)
-        self.address_stack_pointer: uint16 = uint16(0)
+        # plain ints, kept in 16 bit range by instructions themselves
+        self.accumulator: int = 0
+        self.pointer_register: int = 0
+        self.program_counter: int = 0
+        self.flag_register: int = 0
+        self.stack_pointer: int = 0
+        self.address_stack_pointer: int = 0
 
         # misc fields
         self.instructions_executed: int = 0
         self.running: bool = False
         self.exit_code: int = -1
 
-        # instruction lookup table
-        self._instruction_lookup: list[Callable] | None = None
-        self._make_instruction_lookup()
-
-    def _make_instruction_lookup(self):
-        """
-        Generate internal instruction lookup table
-        """
-
-        self._instruction_lookup = [self._unknown_instruction_halt for _ in range(2**self.OPCODE_BIT_WIDTH)]
-        for field in self.__dir__():
-            attr = getattr(self, field)
-            if not attr.__doc__:
-                continue
-            if attr.__doc__.find("INSTRUCTION CALL") > -1:
-                self._instruction_lookup[int(field[2:5])] = attr
+        # whether flags were checked since code was imported; until then they can be out of sync with ACC
+        self._flags_synced: bool = False
 
     def initialize_memory(self):
         """
         Initializes memory arrays
         """
 
-        self.rom = zeros(2**self.ADDRESS_BIT_WIDTH, dtype=uint32)
-        self.cache = zeros(2**self.ADDRESS_BIT_WIDTH, dtype=uint16)
-        self.stack = zeros(2**self.ADDRESS_BIT_WIDTH, dtype=uint16)
-        self.address_stack = zeros(2**self.ADDRESS_BIT_WIDTH, dtype=uint16)
-        self.ports = zeros(2**self.ADDRESS_BIT_WIDTH, dtype=uint16)
+        self.rom_handler = [partial(self._instruction_table[0], self, 0)] * 2**self.ADDRESS_BIT_WIDTH
+        self.rom_check = [False] * 2**self.ADDRESS_BIT_WIDTH
+        self.cache = array('H', [0]) * 2**self.ADDRESS_BIT_WIDTH
+        self.stack = array('H', [0]) * 2**self.ADDRESS_BIT_WIDTH
+        self.address_stack = array('H', [0]) * 2**self.ADDRESS_BIT_WIDTH
+        self.ports = dict()
+        self._flags_synced = False
 
-    def import_code(self, instructions: list[tuple[int, int, int]]):
+    def import_code(self, memory_flags: ndarray, opcodes: ndarray, values: ndarray):
         """
         Imports instructions into ROM
-        :param instructions: list of instruction tuples
-        """
-
-        for idx, instruction in enumerate(instructions):
-            memory_flag = instruction[0]
-            value = instruction[1]
-            opcode = instruction[2]
-
-            # M VVVV`VVVV`VVVV`VVVV OOO`OOOO
-            self.rom[idx] = uint32((memory_flag << 23) + (value << 7) + opcode)
-
-    def run(self):
-        """
-        Executes imported code
-        """
+        :param memory_flags: array of instruction memory flags
+        :param opcodes: array of instruction opcodes
+        :param values: array of instruction values
+        """
+
+        size = len(opcodes)
+        self._flags_synced = False
+
+        # opcode takes only lower bits of its byte
+        memory_flags = memory_flags.tolist()
+        opcodes = (opcodes & (2**self.OPCODE_BIT_WIDTH - 1)).tolist()
+        values = values.tolist()
+
+        # opcodes and memory flags are resolved once, so fetch doesn't need to go through instruction table
+        # and memory mode instructions read their value from cache themselves
+        tables = (self._instruction_table, self._memory_instruction_table)
+        rom_handler = [tables[flag][opcode] for flag, opcode in zip(memory_flags, opcodes)]
+        rom_check = [handler.changes_flags for handler in rom_handler]
+        controls = [handler.control for handler in rom_handler]
+
+        # every run of imported plain instructions, together with control instruction, that ends it,
+        # is generated as one basic block function; jumping into the middle of a block runs the rest of it
+        handlers = [self._instruction_table[opcode] for opcode in opcodes]
+        instructions = list(zip(handlers, memory_flags, values))
+        operands = values.copy()
+        sources = []
+        namespace = dict(_CODE_NAMESPACE)
+        blocks = []
+
+        start = 0
+        while start < size:
+            if handlers[start].control:
+                start += 1
+                continue
 
-        self.running = True
-        while self.running:
-            flag = uint8(self.rom[self.program_counter] >> 23)
-            value = uint16((self.rom[self.program_counter] >> 7))
-            opcode = uint8(self.rom[self.program_counter] & 127)
+            end = start + 1
+            while end < size and end - start < self.MAX_BLOCK_LENGTH and not handlers[end].control:
+                end += 1
 
-            # if memory flag -> use cache value
-            if flag:
-                bus = self.cache[value]
+            if end < size and end - start < self.MAX_BLOCK_LENGTH:
+                control = instructions[end]
+                namespace[f"end_{start}"] = control[0]
             else:
-                bus = value
-
-            # call instruction
-            self._instruction_lookup[opcode](bus)
-            self.instructions_executed += 1
-
-            # check flags
-            self._check_flags()
-
-            # increment counter
-            self.program_counter += 1
+                control = None
 
-    def _set_flag_name(self, name: str, value: bool):
-        """
-        Set flag by name
-        """
+            sources.append(_make_basic_block_source(start, instructions[start:end], control))
+            blocks.append((start, end, control))
 
-        self._set_flag(self.FLAG_MAPPING[name], value)
+            # control instruction itself stays on its own
+            start = end + 1 if control else end
 
-    def _set_flag(self, bit: int, value: bool):
-        """
-        Sets flag by bit index (0 - 15)
-        """
+        # all blocks of the program are compiled at once
+        exec("\n\n".join(sources), namespace)
 
-        if value:
-            self.flag_register |= 1 << bit
-        else:
-            self.flag_register &= ~(uint16(1 << bit))
+        for start, end, control in blocks:
+            block = namespace[f"block_{start}"]
+            for address in range(start, end):
+                rom_handler[address] = block
+                operands[address] = address - start
 
-    def _get_flag_name(self, name: str) -> bool:
-        """
-        Returns flag status by name
-        """
+                # block with control instruction checks flags before it; control instructions don't change them
+                rom_check[address] = control is None and any(x[0].changes_flags for x in instructions[address:end])
 
-        return self._get_flag(self.FLAG_MAPPING[name])
+        # ROM doesn't change, so every instruction is called with the same value; bind it in advance,
+        # together with address for control instructions; rest of ROM keeps shared nop from initialize_memory
+        self.rom_handler[:size] = [
+            partial(handler, self, operand, address) if control else partial(handler, self, operand)
+            for address, (handler, operand, control) in enumerate(zip(rom_handler, operands, controls))]
+        self.rom_check[:size] = rom_check
 
-    def _get_flag(self, bit: int) -> bool:
+    def run(self):
         """
-        Returns flag status by index (0 - 15)
+        Executes imported code
         """
 
-        return (self.flag_register & (1 << bit)) > 0
+        self.running = True
+        while self.running:
+            self.run_chunk()
+
+    def run_chunk(self, budget: int = 4096):
+        """
+        Executes imported code for at most given amount of dispatches (basic block is one dispatch).
+        Returns early when CPU gets halted or interrupted
+        :param budget: maximum number of dispatches
+        """
+
+        # hot loop works on locals; registers stay on self, as instructions modify them directly,
+        # except for program counter, which is returned by control instructions and basic blocks
+        rom_handler = self.rom_handler
+        rom_check = self.rom_check
+        check_flags = self._check_flags
+
+        program_counter = self.program_counter
+        executed = 0
+        try:
+            # flags match ACC after first dispatch checks them; from then on only instructions,
+            # that change ACC or flags, need to check them again
+            if not self._flags_synced and budget:
+                executed = 1
+                next_address = rom_handler[program_counter]()
+                check_flags()
+                self._flags_synced = True
+
+                if next_address is None:
+                    program_counter = (program_counter + 1) & MAX_UINT16
+                else:
+                    program_counter = next_address
+
+            for executed in range(executed + 1, budget + 1):
+                # call instruction; memory mode instructions read the cache themselves
+                next_address = rom_handler[program_counter]()
+
+                # check flags
+                if rom_check[program_counter]:
+                    check_flags()
+
+                # plain instructions return nothing and are followed by the next one
+                if next_address is None:
+                    program_counter = (program_counter + 1) & MAX_UINT16
+                else:
+                    program_counter = next_address
+
+        # halted or interrupted; instruction sets program counter past itself before stopping the CPU
+        except CPUHalt:
+            if rom_check[program_counter] or not self._flags_synced:
+                check_flags()
+            self._flags_synced = True
+            program_counter = self.program_counter
+
+        # write back once per chunk
+        self.program_counter = program_counter
+        self.instructions_executed += executed
 
     def _check_flags(self):
         """
-        Checks some of the flags
+        Checks parity, zero and sign flags
         """
 
-        # parity
-        par = self.accumulator ^ (self.accumulator >> 1)
-        par ^= par >> 2
-        par ^= par >> 4
-        par ^= par >> 8
-        if par & 1:
-            self._set_flag_name("parity", True)
-        else:
-            self._set_flag_name("parity", False)
+        acc = self.accumulator
 
-        # zero
-        if self.accumulator == 0:
-            self._set_flag_name("zero", True)
-        else:
-            self._set_flag_name("zero", False)
+        # set when number of set bits is odd
+        parity = acc.bit_count() & 1
 
-        # sign
-        if self.accumulator & (1 << (self.VALUE_BIT_WIDTH - 1)) > 0:
-            self._set_flag_name("sign", True)
-        else:
-            self._set_flag_name("sign", False)
+        # [SIGN | ZERO | PARITY] - bits 3, 2, 1
+        self.flag_register = ((self.flag_register & ~(SIGN | ZERO | PARITY)) |
+                              (parity << 1) |
+                              ((acc == 0) << 2) |
+                              ((acc >> (self.VALUE_BIT_WIDTH - 1)) << 3))
 
-    def _unknown_instruction_halt(self, *args):
+    def _unknown_instruction_halt(self, value: int, address: int):
         """
         Called on any unknown instruction that is called
         Exit code: -1
         """
 
+        self.program_counter = (address + 1) & MAX_UINT16
         self.running = False
         self.exit_code = -1
+        raise CPUHalt
+
+    _unknown_instruction_halt.control = True
+    _unknown_instruction_halt.changes_flags = False
 
-    def _i000_nop(self, value: uint16):
+    @instruction(0, code="pass")
+    def _i000_nop(self, value: int):
         """
         INSTRUCTION CALL
         nop - No Operation
         """
 
-        # Do nothing
-        pass
-
-    def _i001_load(self, value: uint16):
+    @instruction(1, changes_flags=True, code="acc = {value}")
+    def _i001_load(self, value: int):
         """
         INSTRUCTION CALL
         load - Load - Loads VAL into ACC
         """
 
-        self.accumulator = value
-
-    def _i002_store(self, value: uint16):
+    @instruction(2, code="cache[{value}] = acc")
+    def _i002_store(self, value: int):
         """
         INSTRUCTION CALL
         store - Store - Stores ACC into address defined by VAL
         """
 
-        self.cache[value] = self.accumulator
-
-    def _i003_loadp(self, value: uint16):
+    @instruction(3, changes_flags=True, code="acc = cache[acc]")
+    def _i003_loadp(self, value: int):
         """
         INSTRUCTION CALL
         loadp - Load Pointer - Loads value from cache using ACC as address
         """
 
-        self.accumulator = self.cache[self.accumulator]
-
-    def _i004_loadpr(self, value: uint16):
+    @instruction(4, code="self.pointer_register = {value}")
+    def _i004_loadpr(self, value: int):
         """
         INSTRUCTION CALL
         loadpr - Load Pointer Register - Load VAL into PR
         """
 
-        self.pointer_register = value
-
-    def _i005_storep(self, value: uint16):
+    @instruction(5, code="cache[self.pointer_register] = acc")
+    def _i005_storep(self, value: int):
         """
         INSTRUCTION CALL
         storep - Store Pointer - Store ACC into address defined by PR
         """
 
-        self.cache[self.pointer_register] = self.accumulator
-
-    def _i006_tapr(self, value: uint16):
+    @instruction(6, code="self.pointer_register = acc")
+    def _i006_tapr(self, value: int):
         """
         INSTRUCTION CALL
         tapr - Transfer ACC to PR - Transfers ACC into PR
         """
 
-        self.pointer_register = self.accumulator
-
-    def _i007_push(self, value: uint16):
+    @instruction(7,
+                 code="self.stack[self.stack_pointer] = acc\n"
+                      "self.stack_pointer = (self.stack_pointer + 1) & MAX_UINT16")
+    def _i007_push(self, value: int):
         """
         INSTRUCTION CALL
         push - Push - Push ACC onto number stack
         """
 
-        self.stack[self.stack_pointer] = self.accumulator
-        self.stack_pointer += 1
-
-    def _i008_pop(self, value: uint16):
+    @instruction(8, changes_flags=True,
+                 code="self.stack_pointer = (self.stack_pointer - 1) & MAX_UINT16\n"
+                      "acc = self.stack[self.stack_pointer]")
+    def _i008_pop(self, value: int):
         """
         INSTRUCTION CALL
         pop - Pop - Pop ACC from number stack
         """
 
-        self.stack_pointer -= 1
-        self.accumulator = self.stack[self.stack_pointer]
-
-    def _i009_call(self, value: uint16):
+    @instruction(9, control=True)
+    def _i009_call(self, value: int, address: int) -> int:
         """
         INSTRUCTION CALL
         call - Call - Pushes current IR into stack; jumps to VAL
         """
 
-        self.address_stack[self.address_stack_pointer] = self.program_counter
-        self.address_stack_pointer += 1
-        self.program_counter = value - 1
+        self.address_stack[self.address_stack_pointer] = address
+        self.address_stack_pointer = (self.address_stack_pointer + 1) & MAX_UINT16
+        return value
 
-    def _i010_return(self, value: uint16):
+    @instruction(10, control=True)
+    def _i010_return(self, value: int, address: int) -> int:
         """
         INSTRUCTION CALL
         return - Return - Pops value from stack to IR
         """
 
-        self.address_stack_pointer -= 1
-        self.program_counter = self.address_stack[self.address_stack_pointer]
+        # continues after the call
+        self.address_stack_pointer = (self.address_stack_pointer - 1) & MAX_UINT16
+        return (self.address_stack[self.address_stack_pointer] + 1) & MAX_UINT16
 
-    def _i011_jump(self, value: uint16):
+    @instruction(11, control=True)
+    def _i011_jump(self, value: int, address: int) -> int:
         """
         INSTRUCTION CALL
         jump - Jump - Unconditional jump to VAL
         """
 
-        self.program_counter = value - 1
+        return value
 
-    def _i012_jumpc(self, value: uint16):
+    @instruction(12, control=True)
+    def _i012_jumpc(self, value: int, address: int) -> int:
         """
         INSTRUCTION CALL
         jumpc - Jump Condition - Conditional jump to PR; Condition defined by bitmask
         """
 
-        condition = any(self._get_flag(x) for x in range(16) if (value & (1 << x)))
-
-        if condition:
-            self.program_counter = self.pointer_register - 1
+        # any of the flags in bitmask is set
+        if self.flag_register & value:
+            return self.pointer_register
+        return (address + 1) & MAX_UINT16
 
-    def _i013_clf(self, value: uint16):
+    @instruction(13, changes_flags=True, code="self.flag_register = 0")
+    def _i013_clf(self, value: int):
         """
         INSTRUCTION CALL
         clf - Clear Flag - Clears flags; Flags are defined by bitmask
         """
 
-        self.flag_register = self.flag_register.__class__(0)
-
-    def _i016_and(self, value: uint16):
+    @instruction(16, changes_flags=True, code="acc &= {value}")
+    def _i016_and(self, value: int):
         """
         INSTRUCTION CALL
         and - And - Bitwise AND with ACC and VAL
         """
 
-        self.accumulator = self.accumulator & value
-
-    def _i017_or(self, value: uint16):
+    @instruction(17, changes_flags=True, code="acc |= {value}")
+    def _i017_or(self, value: int):
         """
         INSTRUCTION CALL
         or - Or - Bitwise OR with ACC and VAL
         """
 
-        self.accumulator = self.accumulator | value
-
-    def _i018_xor(self, value: uint16):
+    @instruction(18, changes_flags=True, code="acc ^= {value}")
+    def _i018_xor(self, value: int):
         """
         INSTRUCTION CALL
         xor - Xor - Bitwise XOR with ACC and VAL
         """
 
-        self.accumulator = self.accumulator ^ value
-
-    def _i019_lsl(self, value: uint16):
+    # shifting by whole width or more clears ACC; big shift amounts would build huge ints
+    @instruction(19, changes_flags=True,
+                 code="self.flag_register = (self.flag_register & ~OVERFLOW) | (OVERFLOW if acc >> 15 else 0)\n"
+                      "acc = (acc << {value}) & MAX_UINT16 if {value} < 16 else 0")
+    def _i019_lsl(self, value: int):
         """
         INSTRUCTION CALL
         lsl - Logical Shift Left - Shifts ACC left VAL times
         """
 
-        carry = self.accumulator >> (self.VALUE_BIT_WIDTH - 1)
-        if carry:
-            self._set_flag_name("overflow", True)
-        else:
-            self._set_flag_name("overflow", False)
-
-        self.accumulator = self.accumulator << value
-
-    def _i020_lsr(self, value: uint16):
+    @instruction(20, changes_flags=True,
+                 code="self.flag_register = (self.flag_register & ~UNDERFLOW) | (UNDERFLOW if acc & 1 else 0)\n"
+                      "acc >>= {value}")
+    def _i020_lsr(self, value: int):
         """
         INSTRUCTION CALL
         lsr - Logical Shift Right - Shifts ACC right VAL times
         """
 
-        carry = (self.accumulator & 1) << (self.VALUE_BIT_WIDTH - 1)
-        if carry:
-            self._set_flag_name("underflow", True)
-        else:
-            self._set_flag_name("underflow", False)
-
-        self.accumulator = self.accumulator >> value
-
-    def _i021_rol(self, value: uint16):
+    # bits shifted out on the left come back in on the right
+    @instruction(21, changes_flags=True,
+                 code="acc = ((acc << ({value} & 15)) |\n"
+                      "       (acc >> (16 - ({value} & 15)))) & MAX_UINT16")
+    def _i021_rol(self, value: int):
         """
         INSTRUCTION CALL
         rol - Rotate Left - Rotates ACC left VAL times
         """
 
-        carry = self.accumulator >> (self.VALUE_BIT_WIDTH - 1)
-        self.accumulator = (self.accumulator << value) + carry
-
-    def _i022_ror(self, value: uint16):
+    # bits shifted out on the right come back in on the left
+    @instruction(22, changes_flags=True,
+                 code="acc = ((acc >> ({value} & 15)) |\n"
+                      "       (acc << (16 - ({value} & 15)))) & MAX_UINT16")
+    def _i022_ror(self, value: int):
         """
         INSTRUCTION CALL
         ror - Rotate Right - Rotates ACC right VAL times
         """
 
-        carry = (self.accumulator & 1) << (self.VALUE_BIT_WIDTH - 1)
-        self.accumulator = (self.accumulator >> value) + carry
-
-    def _i023_comp(self, value: uint16):
+    @instruction(23, changes_flags=True, code="acc = MAX_UINT16 if acc < {value} else 0 if acc == {value} else 1")
+    def _i023_comp(self, value: int):
         """
         INSTRUCTION CALL
         comp - Compare - Compares ACC and VAL, -1 if ACC < VAL; 0 if ACC == VAL; 1 if ACC > VAL
         """
 
-        if self.accumulator < value:
-            self.accumulator = uint16(MAX_UINT16)
-        elif self.accumulator == value:
-            self.accumulator = uint16(0)
-        else:
-            self.accumulator = uint16(1)
-
-    def _i032_add(self, value: uint16):
+    @instruction(32, changes_flags=True,
+                 code="acc += {value}\n"
+                      "self.flag_register = (self.flag_register & ~CARRY) | (CARRY if acc > MAX_UINT16 else 0)\n"
+                      "acc &= MAX_UINT16")
+    def _i032_add(self, value: int):
         """
         INSTRUCTION CALL
         add - Add - Add ACC and VAL
         """
 
-        if uint32(self.accumulator) + value > MAX_UINT16:
-            self._set_flag_name("carry", True)
-        else:
-            self._set_flag_name("carry", False)
-
-        self.accumulator = self.accumulator + value
-
-    def _i033_sub(self, value: uint16):
+    @instruction(33, changes_flags=True,
+                 code="acc -= {value}\n"
+                      "self.flag_register = (self.flag_register & ~CARRY) | (CARRY if acc < 0 else 0)\n"
+                      "acc &= MAX_UINT16")
+    def _i033_sub(self, value: int):
         """
         INSTRUCTION CALL
         sub - Add - Subtract VAL from ACC
         """
 
-        if uint32(self.accumulator) - value < 0:
-            self._set_flag_name("carry", True)
-        else:
-            self._set_flag_name("carry", False)
-
-        self.accumulator = self.accumulator - value
-
-    def _i034_addc(self, value: uint16):
+    @instruction(34, changes_flags=True,
+                 code="acc += {value} + (self.flag_register & CARRY)\n"
+                      "self.flag_register = (self.flag_register & ~CARRY) | (CARRY if acc > MAX_UINT16 else 0)\n"
+                      "acc &= MAX_UINT16")
+    def _i034_addc(self, value: int):
         """
         INSTRUCTION CALL
         addc - Add Carry - Add ACC and VAL, with carry
         """
 
-        result = uint32(self.accumulator) + value + self._get_flag_name("carry")
-        if result > MAX_UINT16:
-            self._set_flag_name("carry", True)
-        else:
-            self._set_flag_name("carry", False)
-
-        self.accumulator = uint16(result & MAX_UINT16)
-
-    def _i035_subc(self, value: uint16):
+    @instruction(35, changes_flags=True,
+                 code="acc -= {value} + (self.flag_register & CARRY)\n"
+                      "self.flag_register = (self.flag_register & ~CARRY) | (CARRY if acc < 0 else 0)\n"
+                      "acc &= MAX_UINT16")
+    def _i035_subc(self, value: int):
         """
         INSTRUCTION CALL
         subc - Sub Carry - Subtract VAL from ACC, with carry
         """
 
-        result = uint32(self.accumulator) - value - self._get_flag_name("carry")
-        if result < 0:
-            self._set_flag_name("carry", True)
-        else:
-            self._set_flag_name("carry", False)
-
-        self.accumulator = uint16(result & MAX_UINT16)
-
-    def _i036_inc(self, value: uint16):
+    @instruction(36, changes_flags=True,
+                 code="acc += 1\n"
+                      "self.flag_register = (self.flag_register & ~CARRY) | (CARRY if acc > MAX_UINT16 else 0)\n"
+                      "acc &= MAX_UINT16")
+    def _i036_inc(self, value: int):
         """
         INSTRUCTION CALL
         inc - Increment - Increment ACC
         """
 
-        if uint32(self.accumulator) + 1 > MAX_UINT16:
-            self._set_flag_name("carry", True)
-        else:
-            self._set_flag_name("carry", False)
-
-        self.accumulator += 1
-
-    def _i037_dec(self, value: uint16):
+    @instruction(37, changes_flags=True,
+                 code="acc -= 1\n"
+                      "self.flag_register = (self.flag_register & ~CARRY) | (CARRY if acc < 0 else 0)\n"
+                      "acc &= MAX_UINT16")
+    def _i037_dec(self, value: int):
         """
         INSTRUCTION CALL
         dec - Decrement - Decrement ACC
         """
 
-        if uint32(self.accumulator) - 1 < 0:
-            self._set_flag_name("carry", True)
-        else:
-            self._set_flag_name("carry", False)
-
-        self.accumulator -= 1
-
-    def _i038_mul(self, value: uint16):
+    @instruction(38, changes_flags=True,
+                 code="acc *= {value}\n"
+                      "self.flag_register = (self.flag_register & ~OVERFLOW) | (OVERFLOW if acc > MAX_UINT16 else 0)\n"
+                      "acc &= MAX_UINT16")
+    def _i038_mul(self, value: int):
         """
         INSTRUCTION CALL
         mul - Multiply - Multiply ACC with VAL
         """
 
-        if uint32(self.accumulator) * value > MAX_UINT16:
-            self._set_flag_name("overflow", True)
-        else:
-            self._set_flag_name("overflow", False)
-
-        self.accumulator = self.accumulator * value
-
-    def _i039_div(self, value: uint16):
+    # division by zero results in 0
+    @instruction(39, changes_flags=True, code="acc = acc // {value} if {value} else 0")
+    def _i039_div(self, value: int):
         """
         INSTRUCTION CALL
         div - Divide - Divide ACC by VAL
         """
 
-        self.accumulator = self.accumulator // value
-
-    def _i040_mod(self, value: uint16):
+    # division by zero results in 0
+    @instruction(40, changes_flags=True, code="acc = acc % {value} if {value} else 0")
+    def _i040_mod(self, value: int):
         """
         INSTRUCTION CALL
         mod - Modulo - Remainder of division of ACC by VAL
         """
 
-        self.accumulator = self.accumulator % value
-
-    def _i096_portw(self, value: uint16):
+    @instruction(96, code="self.ports[{value}] = acc")
+    def _i096_portw(self, value: int):
         """
         INSTRUCTION CALL
         portw - Port Write - Writes ACC into port by address VAL
         """
 
-        self.ports[value] = self.accumulator
-
-    def _i097_portr(self, value: uint16):
+    @instruction(97, changes_flags=True, code="acc = self.ports.get({value}, 0)")
+    def _i097_portr(self, value: int):
         """
         INSTRUCTION CALL
         portr - Port Read - Reads port by address VAL into ACC
         """
 
-        self.accumulator = self.ports[value]
-
-    def _i126_int(self, value: uint16):
+    @instruction(126, control=True)
+    def _i126_int(self, value: int, address: int):
         """
         INSTRUCTION CALL
         Exit code: value
         int - Interrupt - Interrupts execution
         """
 
+        self.program_counter = (address + 1) & MAX_UINT16
         self.running = False
         self.exit_code = value
+        raise CPUHalt
 
-    def _i127_halt(self, value: uint16):
+    @instruction(127, control=True)
+    def _i127_halt(self, value: int, address: int):
         """
         INSTRUCTION CALL
         Exit code: 0
         halt - Halt - Halts execution
         """
 
+        self.program_counter = (address + 1) & MAX_UINT16
         self.running = False
         self.exit_code = 0
+        raise CPUHalt
+
+    # [OPCODE] -> instruction; unbound functions, generated once for the class
+    _instruction_table: tuple[Callable, ...] = _make_instruction_table(locals(), OPCODE_BIT_WIDTH)
+
+    # [OPCODE] -> memory mode variant of instruction
+    _memory_instruction_table: tuple[Callable, ...] = tuple(_make_memory_mode(x) for x in _instruction_table)
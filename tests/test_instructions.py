@@ -0,0 +1,371 @@
+"""
+Instruction result tests for QT emulator
+Run from repository root: python -m unittest discover tests
+"""
+
+
+import unittest
+from numpy import array, uint8, uint16
+from source.qt_emulator import QTEmulator, CARRY, ZERO, SIGN, OVERFLOW, UNDERFLOW
+
+
+def make_emulator(program: list[tuple]) -> QTEmulator:
+    """
+    Makes emulator with imported program
+    :param program: list of (opcode, value) or (opcode, value, memory flag) instructions
+    :return: emulator, ready to run
+    """
+
+    emulator = QTEmulator()
+    emulator.initialize_memory()
+    emulator.import_code(
+        array([instruction[2] if len(instruction) > 2 else 0 for instruction in program], dtype=uint8),
+        array([instruction[0] for instruction in program], dtype=uint8),
+        array([instruction[1] for instruction in program], dtype=uint16))
+    return emulator
+
+
+def run_program(program: list[tuple]) -> QTEmulator:
+    """
+    Runs program until it halts
+    :param program: list of (opcode, value) or (opcode, value, memory flag) instructions;
+                    halt is appended automatically
+    :return: halted emulator
+    """
+
+    emulator = make_emulator(program + [(127, 0)])
+    emulator.run()
+    return emulator
+
+
+class TestSubtraction(unittest.TestCase):
+    """
+    sub, subc and dec set carry on borrow
+    """
+
+    def test_sub_borrow(self):
+        emulator = run_program([(1, 3), (33, 5)])
+        self.assertEqual(emulator.accumulator, 0xFFFE)
+        self.assertTrue(emulator.flag_register & CARRY)
+
+    def test_sub_no_borrow(self):
+        emulator = run_program([(1, 5), (33, 5)])
+        self.assertEqual(emulator.accumulator, 0)
+        self.assertFalse(emulator.flag_register & CARRY)
+
+    def test_subc_borrow(self):
+        # 0 - 1 sets carry, then 5 - 5 - carry borrows again
+        emulator = run_program([(1, 0), (33, 1), (1, 5), (35, 5)])
+        self.assertEqual(emulator.accumulator, 0xFFFF)
+        self.assertTrue(emulator.flag_register & CARRY)
+
+    def test_subc_no_borrow(self):
+        emulator = run_program([(1, 0), (33, 1), (1, 6), (35, 5)])
+        self.assertEqual(emulator.accumulator, 0)
+        self.assertFalse(emulator.flag_register & CARRY)
+
+    def test_dec_borrow(self):
+        emulator = run_program([(1, 0), (37, 0)])
+        self.assertEqual(emulator.accumulator, 0xFFFF)
+        self.assertTrue(emulator.flag_register & CARRY)
+
+    def test_dec_no_borrow(self):
+        emulator = run_program([(1, 1), (37, 0)])
+        self.assertEqual(emulator.accumulator, 0)
+        self.assertFalse(emulator.flag_register & CARRY)
+
+
+class TestRotation(unittest.TestCase):
+    """
+    rol and ror rotate ACC, amount is taken modulo 16
+    """
+
+    def test_rol(self):
+        self.assertEqual(run_program([(1, 0x8001), (21, 1)]).accumulator, 0x0003)
+        self.assertEqual(run_program([(1, 0x1234), (21, 4)]).accumulator, 0x2341)
+
+    def test_ror(self):
+        self.assertEqual(run_program([(1, 0x8001), (22, 1)]).accumulator, 0xC000)
+        self.assertEqual(run_program([(1, 0x1234), (22, 4)]).accumulator, 0x4123)
+
+    def test_rotate_full_width(self):
+        self.assertEqual(run_program([(1, 0x1234), (21, 16)]).accumulator, 0x1234)
+        self.assertEqual(run_program([(1, 0x1234), (22, 0)]).accumulator, 0x1234)
+        self.assertEqual(run_program([(1, 0x1234), (21, 20)]).accumulator, 0x2341)
+
+    def test_rotate_memory_mode(self):
+        # amount is read from cache address 7
+        emulator = run_program([(1, 4), (2, 7), (1, 0x1234), (22, 7, 1)])
+        self.assertEqual(emulator.accumulator, 0x4123)
+
+
+class TestFlags(unittest.TestCase):
+    """
+    Flags are checked after first instruction of imported code, even if it doesn't change ACC
+    """
+
+    def test_first_instruction(self):
+        self.assertTrue(run_program([(0, 0)]).flag_register & ZERO)
+
+    def test_reimport(self):
+        emulator = run_program([(1, 5)])
+        self.assertFalse(emulator.flag_register & ZERO)
+
+        # ACC is changed outside of the program, new code starts with flags out of sync
+        emulator.accumulator = 0
+        emulator.program_counter = 0
+        emulator.import_code(array([0, 0], dtype=uint8), array([0, 127], dtype=uint8), array([0, 0], dtype=uint16))
+        emulator.run()
+        self.assertTrue(emulator.flag_register & ZERO)
+
+
+class TestInstructionMethods(unittest.TestCase):
+    """
+    Instruction methods, generated from instruction code, match basic blocks
+    """
+
+    def test_plain_instructions(self):
+        for func in QTEmulator._instruction_table:
+            if func.control:
+                continue
+            for acc, value in ((0, 0), (5, 3), (0xFFFF, 1), (0x8001, 17), (0x1234, 0xFFFF)):
+                with self.subTest(opcode=func.opcode, acc=acc, value=value):
+                    block = run_program([(1, acc), (func.opcode, value)])
+
+                    emulator = run_program([(1, acc)])
+                    func(emulator, value)
+
+                    self.assertEqual(emulator.accumulator, block.accumulator)
+                    self.assertEqual(emulator.flag_register & (CARRY | OVERFLOW | UNDERFLOW),
+                                     block.flag_register & (CARRY | OVERFLOW | UNDERFLOW))
+                    self.assertEqual(emulator.pointer_register, block.pointer_register)
+                    self.assertEqual(emulator.stack_pointer, block.stack_pointer)
+                    self.assertEqual(emulator.cache, block.cache)
+                    self.assertEqual(emulator.stack, block.stack)
+                    self.assertEqual(emulator.ports, block.ports)
+
+
+class TestBasicBlocks(unittest.TestCase):
+    """
+    Straight-line code runs as generated basic blocks, that can be entered at any instruction
+    """
+
+    def test_jump_into_block(self):
+        emulator = run_program([
+            (11, 3),        # 0: jump 3
+            (1, 7),         # 1: load 7
+            (36, 0),        # 2: inc
+            (1, 10),        # 3: load 10
+            (36, 0),        # 4: inc
+        ])
+        self.assertEqual(emulator.accumulator, 11)
+        self.assertEqual(emulator.instructions_executed, 4)
+        self.assertEqual(emulator.program_counter, 6)
+
+    def test_jumpc_into_block(self):
+        emulator = run_program([
+            (4, 4),         # 0: loadpr 4
+            (1, 0),         # 1: load 0
+            (12, ZERO),     # 2: jumpc ZERO
+            (1, 7),         # 3: load 7
+            (36, 0),        # 4: inc
+            (36, 0),        # 5: inc
+        ])
+        self.assertEqual(emulator.accumulator, 2)
+        self.assertEqual(emulator.instructions_executed, 6)
+
+    def test_control_tails(self):
+        emulator = run_program([
+            (1, 6),         # 0: load 6
+            (2, 9),         # 1: store 9
+            (9, 9, 1),      # 2: call [9]
+            (36, 0),        # 3: inc
+            (126, 10, 1),   # 4: int [10]
+            (127, 0),       # 5: halt
+            (1, 41),        # 6: load 41
+            (2, 10),        # 7: store 10
+            (10, 0),        # 8: return
+        ])
+        self.assertEqual(emulator.exit_code, 41)
+        self.assertEqual(emulator.accumulator, 42)
+        self.assertEqual(emulator.program_counter, 5)
+        self.assertEqual(emulator.address_stack[0], 2)
+        self.assertEqual(emulator.address_stack_pointer, 0)
+        self.assertEqual(emulator.instructions_executed, 8)
+
+    def test_jumpc_memory_mode(self):
+        for acc, exit_code in ((0, 2), (1, 1)):
+            with self.subTest(acc=acc):
+                emulator = run_program([
+                    (1, ZERO),      # 0: load ZERO
+                    (2, 20),        # 1: store 20
+                    (1, acc),       # 2: load ACC
+                    (4, 6),         # 3: loadpr 6
+                    (12, 20, 1),    # 4: jumpc [20]
+                    (126, 1),       # 5: int 1
+                    (126, 2),       # 6: int 2
+                ])
+                self.assertEqual(emulator.exit_code, exit_code)
+
+    def test_longer_than_block(self):
+        length = QTEmulator.MAX_BLOCK_LENGTH + 8
+        emulator = run_program([(36, 0)] * length)
+        self.assertEqual(emulator.accumulator, length)
+        self.assertEqual(emulator.instructions_executed, length + 1)
+        self.assertEqual(emulator.program_counter, length + 1)
+
+    def test_jump_past_block_split(self):
+        # incs start at address 1, so second block starts at MAX_BLOCK_LENGTH + 1; jump into its middle
+        length = QTEmulator.MAX_BLOCK_LENGTH + 8
+        emulator = run_program([(11, QTEmulator.MAX_BLOCK_LENGTH + 2)] + [(36, 0)] * length)
+        self.assertEqual(emulator.accumulator, 7)
+        self.assertEqual(emulator.instructions_executed, 9)
+
+
+class TestControl(unittest.TestCase):
+    """
+    Control instructions continue at the right address
+    """
+
+    def test_call_return(self):
+        emulator = run_program([
+            (9, 3),         # 0: call 3
+            (1, 5),         # 1: load 5
+            (127, 0),       # 2: halt
+            (10, 0),        # 3: return
+        ])
+        self.assertEqual(emulator.accumulator, 5)
+        self.assertEqual(emulator.program_counter, 3)
+        self.assertEqual(emulator.address_stack_pointer, 0)
+        self.assertEqual(emulator.instructions_executed, 4)
+
+    def test_jumpc(self):
+        for acc, exit_code, program_counter in ((0, 2, 5), (1, 1, 4)):
+            with self.subTest(acc=acc):
+                emulator = run_program([
+                    (4, 4),         # 0: loadpr 4
+                    (1, acc),       # 1: load ACC
+                    (12, ZERO),     # 2: jumpc ZERO
+                    (126, 1),       # 3: int 1
+                    (126, 2),       # 4: int 2
+                ])
+                self.assertEqual(emulator.exit_code, exit_code)
+                self.assertEqual(emulator.program_counter, program_counter)
+
+    def test_jumpc_not_taken_first(self):
+        # flags are cleared before first instruction
+        emulator = run_program([(12, 0xFFFF), (126, 1)])
+        self.assertEqual(emulator.exit_code, 1)
+
+    def test_int(self):
+        emulator = make_emulator([(1, 3), (126, 128), (127, 0)])
+        emulator.run()
+        self.assertFalse(emulator.running)
+        self.assertEqual(emulator.exit_code, 128)
+        self.assertEqual(emulator.program_counter, 2)
+
+        # resumes after interrupt
+        emulator.run()
+        self.assertEqual(emulator.exit_code, 0)
+        self.assertEqual(emulator.program_counter, 3)
+        self.assertEqual(emulator.instructions_executed, 3)
+
+    def test_halt(self):
+        emulator = make_emulator([(127, 0), (126, 1)])
+        emulator.run()
+        self.assertFalse(emulator.running)
+        self.assertEqual(emulator.exit_code, 0)
+        self.assertEqual(emulator.program_counter, 1)
+
+    def test_wraparound(self):
+        # last address of ROM is nop, when no code is imported there
+        emulator = make_emulator([(11, 0xFFFF)])
+        emulator.run_chunk(2)
+        self.assertEqual(emulator.program_counter, 0)
+        self.assertEqual(emulator.instructions_executed, 2)
+
+        # halt at last address
+        emulator = make_emulator([(11, 0xFFFF)] + [(127, 0)] * (2**QTEmulator.ADDRESS_BIT_WIDTH - 1))
+        emulator.run()
+        self.assertEqual(emulator.exit_code, 0)
+        self.assertEqual(emulator.program_counter, 0)
+        self.assertEqual(emulator.instructions_executed, 2)
+
+
+class TestOpcodes(unittest.TestCase):
+    """
+    Opcode is taken from lower 7 bits of its byte
+    """
+
+    def test_unknown_opcode(self):
+        # 200 & 127 = 72, which is not an instruction
+        emulator = run_program([(1, 5), (200, 0)])
+        self.assertFalse(emulator.running)
+        self.assertEqual(emulator.exit_code, -1)
+        self.assertEqual(emulator.program_counter, 2)
+
+    def test_high_bit_ignored(self):
+        # 128 | 1 is load
+        self.assertEqual(run_program([(129, 7)]).accumulator, 7)
+
+
+class TestChunks(unittest.TestCase):
+    """
+    Running in chunks of any size gives the same result
+    """
+
+    # counts cache[0] up to 5, with a syscall interrupt on every iteration
+    program = [
+        (1, 0),         # 0: load 0
+        (2, 0),         # 1: store 0
+        (1, 0, 1),      # 2: load [0]
+        (36, 0),        # 3: inc
+        (2, 0),         # 4: store 0
+        (126, 0x80),    # 5: int 0x80
+        (23, 5),        # 6: comp 5
+        (4, 2),         # 7: loadpr 2
+        (12, SIGN),     # 8: jumpc SIGN
+        (127, 0),       # 9: halt
+    ]
+
+    def run_chunks(self, budget: int) -> tuple[QTEmulator, list[int]]:
+        """
+        Runs program in chunks, resuming it after every syscall, like application does
+        :return: halted emulator and program counters at syscalls
+        """
+
+        emulator = make_emulator(self.program)
+        syscalls = []
+        emulator.running = True
+        while emulator.running:
+            emulator.run_chunk(budget)
+            if not emulator.running and emulator.exit_code == 0x80:
+                syscalls.append(emulator.program_counter)
+                emulator.running = True
+        return emulator, syscalls
+
+    def test_budget_runs_out(self):
+        # endless loop; one dispatch is inc and jump, run as one basic block
+        emulator = make_emulator([(36, 0), (11, 0)])
+        emulator.running = True
+        emulator.run_chunk(3)
+        self.assertTrue(emulator.running)
+        self.assertEqual(emulator.accumulator, 3)
+        self.assertEqual(emulator.instructions_executed, 6)
+        self.assertEqual(emulator.program_counter, 0)
+
+    def test_chunk_sizes(self):
+        single, single_syscalls = self.run_chunks(1)
+        whole, whole_syscalls = self.run_chunks(4096)
+
+        self.assertEqual(single.cache[0], 5)
+        self.assertEqual(single_syscalls, [6] * 5)
+        self.assertEqual(single_syscalls, whole_syscalls)
+        for name in ("accumulator", "pointer_register", "program_counter", "flag_register",
+                     "instructions_executed", "exit_code", "running"):
+            self.assertEqual(getattr(single, name), getattr(whole, name), name)
+        self.assertEqual(single.instructions_executed, 2 + 5 * 7 + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()